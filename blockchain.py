@@ -1,33 +1,251 @@
 import json
+import math
+import mmap
+import struct
+import sys
 import time
 import hashlib
 from typing import Dict, List
 import os
 import logging
+import logging.handlers
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+# Use orjson for chain files when available (optional dependency)
+try:
+    import orjson
+except ImportError:
+    def _json_dumps(obj) -> bytes:
+        return json.dumps(obj).encode()
+    _json_loads = json.loads
+else:
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+
+# Stream-parse chain files with ijson when available (optional dependency)
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# hashlib.sha256 is already the OpenSSL implementation (SHA-NI where the CPU
+# has it) when CPython is linked against OpenSSL; bind it once for the hot path.
+_SHA256 = hashlib.sha256
+
+# Users of the network, in canonical lower-case form
+_USERS = ("alice", "bob", "charlie", "dave")
+_USER_SET = frozenset(_USERS)
+
+# Canonical names seen so far; bounded since names also arrive from peers
+_CANON_CACHE: Dict[str, str] = {}
+_CANON_CACHE_SIZE = 1024
+
+def _canon(name: str) -> str:
+    """Return the lower-case, interned form of a user name."""
+    canonical = _CANON_CACHE.get(name)
+    if canonical is None:
+        canonical = sys.intern(name.lower())
+        if len(_CANON_CACHE) < _CANON_CACHE_SIZE:
+            _CANON_CACHE[name] = canonical
+    return canonical
+
+# Amounts are held as integer paise internally and shown in rupees
+_PAISE_PER_RUPEE = 100
+
+# Chain file format: 2 stores transaction amounts as integer paise,
+# 3 length-prefixes the names in the hash preimage
+_CHAIN_FORMAT_VERSION = 3
+
+# Amounts must fit the int64 column store and ledger records
+_MAX_PAISE = 2 ** 63 - 1
+
+def _to_paise(rupees: float) -> int:
+    """Convert an amount in rupees to integer paise."""
+    if not math.isfinite(rupees) or abs(rupees * _PAISE_PER_RUPEE) > _MAX_PAISE:
+        raise ValueError(f"Invalid amount: {rupees}")
+    return round(rupees * _PAISE_PER_RUPEE)
+
+def _check_paise(paise) -> int:
+    """Return an amount in paise, raising ValueError unless it is an int64 integer."""
+    if type(paise) is not int or not -_MAX_PAISE <= paise <= _MAX_PAISE:
+        raise ValueError(f"Invalid amount: {paise}")
+    return paise
+
+def _check_format_version(version) -> None:
+    """Raise ValueError for chain files written by a newer, incompatible format."""
+    if version > _CHAIN_FORMAT_VERSION:
+        raise ValueError(f"Unsupported chain format version {version}")
+
+def _read_format_version(f) -> int:
+    """Read the version tag ahead of the chain in a snapshot without parsing the blocks."""
+    for prefix, event, value in ijson.parse(f):
+        if prefix == "version" and event == "number":
+            return value
+        if prefix == "chain" and event == "start_array":
+            break
+    
+    # Snapshots from before the tag was added hold float rupee amounts
+    return 1
+
+def _to_rupees(paise: int) -> float:
+    """Convert an amount in integer paise to rupees."""
+    return paise / _PAISE_PER_RUPEE
+
+# Per-user ledger record: timestamp, type id, counterparty id, amount in paise, block hash
+_TX_STRUCT = struct.Struct("<dBBq32s")
+_TX_TYPES = ("initial_balance", "sent", "received")
+_TX_TYPE_IDS = {tx_type: i for i, tx_type in enumerate(_TX_TYPES)}
+_NO_COUNTERPARTY_ID = 255
+
+# Per-user balance file: a single little-endian int64 of paise
+_BALANCE_STRUCT = struct.Struct("<q")
+
+def _format_timestamp(timestamp: float) -> str:
+    """Format a timestamp for logs and transaction history."""
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+# Previous hash of the genesis block
+_GENESIS_PREVIOUS_HASH = bytes(32)
+
+# Column store ids for transaction parties that are not users
+_NO_USER_ID = -1
+_INITIAL_BALANCE_ID = -2
+
+def _replay_balances(sender_ids, recipient_ids, amounts, n_users):
+    """Fold the transaction columns into per-user balances, skipping the genesis block."""
+    balances = [0 for _ in range(n_users)]
+    
+    for i in range(1, len(amounts)):
+        sender = sender_ids[i]
+        recipient = recipient_ids[i]
+        amount = amounts[i]
+        
+        # Handle initial balance setting
+        if sender == _INITIAL_BALANCE_ID:
+            if recipient >= 0:
+                balances[recipient] = amount
+            continue
+        
+        if sender >= 0:
+            balances[sender] -= amount
+        
+        if recipient >= 0:
+            balances[recipient] += amount
+    
+    return balances
+
+def _block_preimage(index: int, timestamp: float, transaction: Dict, previous_hash: bytes) -> bytes:
+    """Serialize a block's contents into the bytes that are hashed."""
+    # Names are length-prefixed so no two sender/recipient pairs serialize alike
+    sender = transaction["sender"].encode()
+    recipient = transaction["recipient"].encode()
+    return b"%d|%r|%d:%s|%d:%s|%d|%s" % (
+        index,
+        timestamp,
+        len(sender),
+        sender,
+        len(recipient),
+        recipient,
+        transaction["amount_paise"],
+        previous_hash
+    )
+
+def _legacy_hash_v0(block_dict: Dict) -> str:
+    """Hash a block as written by the original chain format, which hashed sorted-key JSON."""
+    block_string = json.dumps({
+        "index": block_dict["index"],
+        "timestamp": block_dict["timestamp"],
+        "transaction": block_dict["transaction"],
+        "previous_hash": block_dict["previous_hash"]
+    }, sort_keys=True).encode()
+    return _SHA256(block_string).hexdigest()
+
+def _legacy_hash_v1(block_dict: Dict) -> str:
+    """Hash a block as written by chain format 1, which held float rupee amounts."""
+    transaction = block_dict["transaction"]
+    preimage = b"%d|%r|%s|%s|%r|%s" % (
+        block_dict["index"],
+        block_dict["timestamp"],
+        transaction["sender"].encode(),
+        transaction["recipient"].encode(),
+        transaction["amount"],
+        bytes.fromhex(block_dict["previous_hash"])
+    )
+    return _SHA256(preimage).hexdigest()
+
+def _legacy_hash_v2(block_dict: Dict) -> str:
+    """Hash a block as written by chain format 2, which joined names without length prefixes."""
+    transaction = block_dict["transaction"]
+    preimage = b"%d|%r|%s|%s|%d|%s" % (
+        block_dict["index"],
+        block_dict["timestamp"],
+        transaction["sender"].encode(),
+        transaction["recipient"].encode(),
+        transaction["amount_paise"],
+        bytes.fromhex(block_dict["previous_hash"])
+    )
+    return _SHA256(preimage).hexdigest()
+
+# Block hash functions of older chain formats, used only to verify files before migrating them
+_LEGACY_HASHES = {0: _legacy_hash_v0, 1: _legacy_hash_v1, 2: _legacy_hash_v2}
+
+def _untagged_format_version(block_dicts: List[Dict]) -> int:
+    """Tell apart the two formats written before the version tag: the original links genesis to "0"."""
+    if block_dicts and block_dicts[0].get("previous_hash") == "0":
+        return 0
+    return 1
+
+def _verify_chunk(rows: List[tuple]) -> int:
+    """Rehash (index, preimage, hash) rows and return the index of the first bad block, or -1."""
+    sha256 = _SHA256
+    for index, preimage, block_hash in rows:
+        if sha256(preimage).digest() != block_hash:
+            return index
+    return -1
+
+# Compile the replay loop when numba is available (optional dependency)
+try:
+    from numba import njit
+except ImportError:
+    pass
+else:
+    _replay_balances = njit(cache=True)(_replay_balances)
 
 class Block:
-    def __init__(self, index: int, timestamp: float, transaction: Dict, previous_hash: str, logger=None):
+    def __init__(self, index: int, timestamp: float, transaction: Dict, previous_hash: bytes, logger=None):
         self.index = index
         self.timestamp = timestamp
         self.transaction = transaction
         self.previous_hash = previous_hash
+        
+        # Block contents are fixed after construction, so serialize them once
+        self._preimage = _block_preimage(index, timestamp, transaction, previous_hash)
         self.hash = self.calculate_hash()
+        self._hex_hash = None
+        self._ts_str = None
         self.logger = logger
         
         if self.logger:
-            self.logger.info(f"Created new block: {self.index} with hash: {self.hash}")
+            self.logger.info(f"Created new block: {self.index} with hash: {self.hex_hash}")
             self.logger.info(f"Block transaction: {self.transaction}")
     
-    def calculate_hash(self) -> str:
-        """Calculate the SHA-256 hash of the block contents."""
-        block_string = json.dumps({
-            "index": self.index,
-            "timestamp": self.timestamp,
-            "transaction": self.transaction,
-            "previous_hash": self.previous_hash
-        }, sort_keys=True).encode()
-        
-        return hashlib.sha256(block_string).hexdigest()
+    def calculate_hash(self) -> bytes:
+        """Calculate the SHA-256 digest of the block contents."""
+        return _SHA256(self._preimage).digest()
+    
+    def timestamp_str(self) -> str:
+        """Return the block timestamp formatted for logs and user files."""
+        if self._ts_str is None:
+            self._ts_str = _format_timestamp(self.timestamp)
+        return self._ts_str
+    
+    @property
+    def hex_hash(self) -> str:
+        """Hex form of the block hash, for display and serialization."""
+        if self._hex_hash is None:
+            self._hex_hash = self.hash.hex()
+        return self._hex_hash
     
     def to_dict(self) -> Dict:
         """Convert block to dictionary for serialization."""
@@ -35,42 +253,104 @@ class Block:
             "index": self.index,
             "timestamp": self.timestamp,
             "transaction": self.transaction,
-            "previous_hash": self.previous_hash,
-            "hash": self.hash
+            "previous_hash": self.previous_hash.hex(),
+            "hash": self.hex_hash
         }
     
     @classmethod
     def from_dict(cls, block_dict: Dict) -> 'Block':
         """Create a block from a dictionary."""
-        block = cls(
+        transaction = block_dict["transaction"]
+        if "amount_paise" not in transaction:
+            # Older blocks are only accepted through Blockchain._migrate_chain, which rehashes them
+            raise ValueError(f"Block {block_dict['index']} uses an old chain format")
+        _check_paise(transaction["amount_paise"])
+        
+        block = cls._from_trusted(
             block_dict["index"],
             block_dict["timestamp"],
-            block_dict["transaction"],
-            block_dict["previous_hash"]
+            transaction,
+            bytes.fromhex(block_dict["previous_hash"]),
+            bytes.fromhex(block_dict["hash"])
         )
-        block.hash = block_dict["hash"]
+        block._hex_hash = block_dict["hash"]
+        return block
+    
+    @classmethod
+    def _from_trusted(cls, index: int, timestamp: float, transaction: Dict, previous_hash: bytes, block_hash: bytes) -> 'Block':
+        """Create a block with a known hash, without hashing its contents."""
+        block = cls.__new__(cls)
+        block.index = index
+        block.timestamp = timestamp
+        block.transaction = transaction
+        block.previous_hash = previous_hash
+        block._preimage = _block_preimage(index, timestamp, transaction, previous_hash)
+        block.hash = block_hash
+        block._hex_hash = None
+        block._ts_str = None
+        block.logger = None
         return block
 
 class Blockchain:
     def __init__(self, user_id: str):
-        self.user_id = user_id.lower()
+        self.user_id = _canon(user_id)
         self.chain = []
-        self.users = ["alice", "bob", "charlie", "dave"]
+        self.users = list(_USERS)
         self.pending_transactions = []
         
+        # Zero balance for every user, copied wherever a fresh balances dict is needed
+        self._bal_template = dict.fromkeys(self.users, 0)
+        
+        # Running balances, kept in step with the chain
+        self._balances = self._bal_template.copy()
+        
+        # Column store of the chain, kept in parallel with self.chain
+        self._user_index = {user: i for i, user in enumerate(self.users)}
+        self._reset_columns()
+        
+        # User files: an append-only binary ledger plus a balance file per user
+        self._user_ledger = {}
+        self._user_balance_file = {}
+        self._user_balances = {}
+        
+        # Blockchain file is a snapshot plus an append-only log of newer blocks
+        self.blockchain_file = f"data/{self.user_id}_blockchain.json"
+        self.block_log_file = f"data/{self.user_id}_blockchain.jsonl"
+        self._block_log = None
+        self.autosave_interval = 64
+        
+        # Set when the chain file was written in an older format and rebuilt on load
+        self._migrated = False
+        self._blocks_since_save = 0
+        
+        # Rehash in worker processes once the chain is at least this long
+        self.parallel_verify_threshold = 20000
+        
+        # Print the balance table after every block
+        self.autodisplay = False
+        
+        # Echo the balance table to the console when it is displayed
+        self.verbose = True
+        
         # Set up logging first
         self.setup_logging()
         
         # Load blockchain if it exists
-        blockchain_file = f"data/{self.user_id}_blockchain.json"
-        if os.path.exists(blockchain_file):
-            self.load_from_file(blockchain_file)
+        if os.path.exists(self.blockchain_file):
+            self.load_from_file(self.blockchain_file)
         else:
             # Create genesis block
             self.create_genesis_block()
         
         # Create user files if they don't exist
         self.create_user_files()
+        
+        # Open user files for appending
+        self.open_user_files()
+        
+        # Migrated blocks have new hashes, so rewrite the ledgers that record them
+        if self._migrated:
+            self.update_all_user_files()
     
     def setup_logging(self):
         """Set up logging for the blockchain."""
@@ -91,12 +371,19 @@ class Blockchain:
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         file_handler.setFormatter(formatter)
         
+        # Buffer records in memory so bursts of INFO messages don't each hit the file
+        self._log_buffer = logging.handlers.MemoryHandler(capacity=1024, flushLevel=logging.WARNING, target=file_handler)
+        
         # Add handler to logger
-        self.logger.addHandler(file_handler)
+        self.logger.addHandler(self._log_buffer)
         
         # Create transaction log file with headers
-        with open(f"logs/{self.user_id}_transactions.log", "w") as f:
+        transaction_log_file = f"logs/{self.user_id}_transactions.log"
+        with open(transaction_log_file, "w") as f:
             f.write("Timestamp,Transaction Hash,Sender,Recipient,Amount,Alice Balance,Bob Balance,Charlie Balance,Dave Balance\n")
+        
+        # Keep the transaction log open for the lifetime of the blockchain
+        self._tx_log_fh = open(transaction_log_file, "a", buffering=65536)
     
     def create_user_files(self):
         """Create individual files for each user."""
@@ -104,15 +391,13 @@ class Blockchain:
             os.makedirs("users")
         
         for user in self.users:
-            user_file = f"users/{user}.json"
-            if not os.path.exists(user_file):
-                user_data = {
-                    "name": user.capitalize(),
-                    "balance": 0,  # Initial balance will be set by user
-                    "transactions": []
-                }
-                with open(user_file, 'w') as f:
-                    json.dump(user_data, f, indent=2)
+            ledger_file = f"users/{user}.bin"
+            if not os.path.exists(ledger_file):
+                open(ledger_file, 'wb').close()
+                
+                # Initial balance will be set by user
+                with open(f"users/{user}.balance", 'wb') as f:
+                    f.write(_BALANCE_STRUCT.pack(0))
                 self.logger.info(f"Created user file for {user}")
     
     def create_genesis_block(self):
@@ -120,13 +405,13 @@ class Blockchain:
         genesis_block = Block(0, time.time(), {
             "sender": "genesis",
             "recipient": "genesis",
-            "amount": 0
-        }, "0", self.logger)
-        self.chain.append(genesis_block)
-        self.logger.info(f"Genesis block created with hash: {genesis_block.hash}")
+            "amount_paise": 0
+        }, _GENESIS_PREVIOUS_HASH, self.logger)
+        self._append_block(genesis_block)
+        self.logger.info(f"Genesis block created with hash: {genesis_block.hex_hash}")
         
         # Save blockchain
-        self.save_to_file(f"data/{self.user_id}_blockchain.json")
+        self.save_to_file(self.blockchain_file)
     
     def get_latest_block(self) -> Block:
         """Return the most recent block in the chain."""
@@ -134,8 +419,8 @@ class Blockchain:
     
     def is_transaction_valid(self, transaction: Dict) -> bool:
         """Check if a transaction is valid based on sender's balance."""
-        sender = transaction["sender"].lower()
-        amount = transaction["amount"]
+        sender = _canon(transaction["sender"])
+        amount = transaction["amount_paise"]
         
         # Skip validation for genesis transactions
         if sender == "genesis":
@@ -145,25 +430,29 @@ class Blockchain:
         if sender == "initial_balance":
             return True
         
-        # Get current balances
-        balances = self.calculate_balances()
+        # Use the cached balances
+        balances = self._balances
         
         # Check if sender has enough balance
         if sender in balances and balances[sender] >= amount:
-            self.logger.info(f"Transaction valid: {sender} has sufficient balance ({balances[sender]} rupees) for {amount} rupees transfer")
+            self.logger.info(f"Transaction valid: {sender} has sufficient balance ({_to_rupees(balances[sender])} rupees) for {_to_rupees(amount)} rupees transfer")
             return True
         else:
-            self.logger.warning(f"Transaction invalid: {sender} has insufficient balance ({balances.get(sender, 0)} rupees) for {amount} rupees transfer")
+            self.logger.warning(f"Transaction invalid: {sender} has insufficient balance ({_to_rupees(balances.get(sender, 0))} rupees) for {_to_rupees(amount)} rupees transfer")
             return False
     
     def add_transaction(self, sender: str, recipient: str, amount: float) -> Block:
         """Create a transaction and add it to the blockchain if valid."""
         transaction = {
-            "sender": sender.lower(),
-            "recipient": recipient.lower(),
-            "amount": amount
+            "sender": _canon(sender),
+            "recipient": _canon(recipient),
+            "amount_paise": _to_paise(amount)
         }
         
+        # Reject amounts that round to zero paise as well as negative ones
+        if transaction["amount_paise"] <= 0:
+            raise ValueError(f"Invalid amount: {amount} rupees is not a positive number of paise")
+        
         # Validate transaction first
         if not self.is_transaction_valid(transaction):
             self.logger.error(f"Failed to add transaction: Insufficient funds")
@@ -175,20 +464,22 @@ class Blockchain:
         new_timestamp = time.time()
         new_block = Block(new_index, new_timestamp, transaction, previous_block.hash, self.logger)
         
-        self.chain.append(new_block)
-        self.logger.info(f"Added block {new_index} with hash: {new_block.hash}")
+        self._append_block(new_block)
+        self.logger.info(f"Added block {new_index} with hash: {new_block.hex_hash}")
+        balances = self.calculate_balances()
         
         # Update transaction log
-        self.update_transaction_log(new_block)
+        self.update_transaction_log(new_block, balances)
         
         # Update user files
         self.update_user_files(new_block)
         
         # Display balance table after transaction
-        self.display_balance_table()
+        if self.autodisplay:
+            self.display_balance_table(balances)
         
         # Save blockchain
-        self.save_to_file(f"data/{self.user_id}_blockchain.json")
+        self._append_block_log(new_block)
         
         return new_block
     
@@ -198,7 +489,7 @@ class Blockchain:
         transaction = {
             "sender": "initial_balance",
             "recipient": self.user_id,
-            "amount": balance
+            "amount_paise": _to_paise(balance)
         }
         
         # Create a new block with the transaction
@@ -207,47 +498,46 @@ class Blockchain:
         new_timestamp = time.time()
         new_block = Block(new_index, new_timestamp, transaction, previous_block.hash, self.logger)
         
-        self.chain.append(new_block)
-        self.logger.info(f"Added initial balance block {new_index} with hash: {new_block.hash}")
+        self._append_block(new_block)
+        self.logger.info(f"Added initial balance block {new_index} with hash: {new_block.hex_hash}")
         
         # Update user file
-        user_file = f"users/{self.user_id}.json"
-        if os.path.exists(user_file):
-            with open(user_file, 'r') as f:
-                user_data = json.load(f)
-            
+        if self.user_id in self._user_balance_file:
             # Set balance
-            user_data["balance"] = balance
-            
-            # Write updated data back to file
-            with open(user_file, 'w') as f:
-                json.dump(user_data, f, indent=2)
+            self._user_balances[self.user_id] = transaction["amount_paise"]
+            self._write_user_balance(self.user_id)
             
             self.logger.info(f"Set initial balance for {self.user_id} to {balance}")
         
         # Save blockchain
-        self.save_to_file(f"data/{self.user_id}_blockchain.json")
+        self._append_block_log(new_block)
         
         # Display balance table
-        self.display_balance_table()
+        if self.autodisplay:
+            self.display_balance_table()
     
-    def update_transaction_log(self, block: Block):
+    def update_transaction_log(self, block: Block, balances: Dict[str, float] = None):
         """Update the transaction log file with the new transaction."""
         transaction = block.transaction
-        balances = self.calculate_balances()
+        if balances is None:
+            balances = self.calculate_balances()
         
-        with open(f"logs/{self.user_id}_transactions.log", "a") as f:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(block.timestamp))
-            f.write(f"{timestamp},{block.hash},{transaction['sender']},{transaction['recipient']},{transaction['amount']},"
-                   f"{balances.get('alice', 0)},{balances.get('bob', 0)},{balances.get('charlie', 0)},{balances.get('dave', 0)}\n")
+        timestamp = block.timestamp_str()
+        self._tx_log_fh.write(f"{timestamp},{block.hex_hash},{transaction['sender']},{transaction['recipient']},{_to_rupees(transaction['amount_paise'])},"
+                              f"{balances['alice']},{balances['bob']},{balances['charlie']},{balances['dave']}\n")
     
     def update_user_files(self, block: Block):
         """Update the individual user files with the new transaction."""
+        for user, tx_type, counterparty, amount in self._user_entries(block):
+            self.update_user_file(user, tx_type, counterparty, amount, block)
+    
+    @staticmethod
+    def _user_entries(block: Block):
+        """Yield (user, type, counterparty, amount) for each user file a block touches."""
         transaction = block.transaction
-        sender = transaction["sender"].lower()
-        recipient = transaction["recipient"].lower()
-        amount = transaction["amount"]
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(block.timestamp))
+        sender = _canon(transaction["sender"])
+        recipient = _canon(transaction["recipient"])
+        amount = transaction["amount_paise"]
         
         # Skip genesis transactions
         if sender == "genesis" and recipient == "genesis":
@@ -255,105 +545,185 @@ class Blockchain:
         
         # Handle initial balance setting
         if sender == "initial_balance":
-            self.update_user_file(recipient, amount, {
-                "type": "initial_balance",
-                "amount": amount,
-                "timestamp": timestamp,
-                "block_hash": block.hash
-            })
+            if recipient in _USER_SET:
+                yield recipient, "initial_balance", None, amount
             return
         
         # Update sender's file if it's one of our users
-        if sender in self.users:
-            self.update_user_file(sender, -amount, {
-                "type": "sent",
-                "to": recipient,
-                "amount": amount,
-                "timestamp": timestamp,
-                "block_hash": block.hash
-            })
+        if sender in _USER_SET:
+            yield sender, "sent", recipient, amount
         
         # Update recipient's file if it's one of our users
-        if recipient in self.users:
-            self.update_user_file(recipient, amount, {
-                "type": "received",
-                "from": sender,
-                "amount": amount,
-                "timestamp": timestamp,
-                "block_hash": block.hash
-            })
-    
-    def update_user_file(self, user: str, amount_change: float, transaction_data: Dict):
-        """Update a specific user's file with transaction data."""
-        user_file = f"users/{user}.json"
-        
-        if os.path.exists(user_file):
-            with open(user_file, 'r') as f:
-                user_data = json.load(f)
-            
-            # Update balance for normal transactions
-            if transaction_data["type"] != "initial_balance":
-                user_data["balance"] += amount_change
-            else:
-                # For initial balance, set the balance directly
-                user_data["balance"] = amount_change
+        if recipient in _USER_SET:
+            yield recipient, "received", sender, amount
+    
+    @staticmethod
+    def _next_user_balance(balance: int, tx_type: str, amount: int) -> int:
+        """Return a user's balance after applying one transaction."""
+        # Update balance for normal transactions
+        if tx_type == "sent":
+            return balance - amount
+        if tx_type == "received":
+            return balance + amount
+        
+        # For initial balance, set the balance directly
+        return amount
+    
+    def _pack_user_record(self, tx_type: str, counterparty: str, amount: int, block: Block) -> bytes:
+        """Pack a transaction into a user ledger record."""
+        return _TX_STRUCT.pack(
+            block.timestamp,
+            _TX_TYPE_IDS[tx_type],
+            self._user_index.get(counterparty, _NO_COUNTERPARTY_ID),
+            amount,
+            block.hash
+        )
+    
+    def update_user_file(self, user: str, tx_type: str, counterparty: str, amount: int, block: Block):
+        """Append a transaction record to a user's ledger and update their balance."""
+        ledger = self._user_ledger.get(user)
+        
+        if ledger is not None:
+            self._user_balances[user] = self._next_user_balance(self._user_balances[user], tx_type, amount)
+            self._write_user_balance(user)
             
             # Add transaction to history
-            user_data["transactions"].append(transaction_data)
-            
-            # Write updated data back to file
-            with open(user_file, 'w') as f:
-                json.dump(user_data, f, indent=2)
+            ledger.write(self._pack_user_record(tx_type, counterparty, amount, block))
             
             self.logger.info(f"Updated user file for {user}")
     
+    def _write_user_balance(self, user: str):
+        """Overwrite a user's balance file in place."""
+        balance_file = self._user_balance_file[user]
+        balance_file.seek(0)
+        balance_file.write(_BALANCE_STRUCT.pack(self._user_balances[user]))
+    
+    def open_user_files(self):
+        """Read each user's balance and open their ledger for appending."""
+        for user in self.users:
+            balance_file = open(f"users/{user}.balance", 'r+b')
+            self._user_balances[user] = _BALANCE_STRUCT.unpack(balance_file.read(_BALANCE_STRUCT.size))[0]
+            self._user_balance_file[user] = balance_file
+            self._user_ledger[user] = open(f"users/{user}.bin", 'ab', buffering=65536)
+    
+    def _flush_user_files(self):
+        """Flush buffered ledger records and balances to disk."""
+        for ledger in self._user_ledger.values():
+            ledger.flush()
+        for balance_file in self._user_balance_file.values():
+            balance_file.flush()
+    
+    def _reset_columns(self):
+        """Clear the column store."""
+        self._col_sender = array('b')
+        self._col_recipient = array('b')
+        self._col_amount = array('q')
+        self._col_hash = []
+        self._col_previous_hash = []
+    
+    def _append_columns(self, block: Block):
+        """Append a block's fields to the column store."""
+        transaction = block.transaction
+        
+        # Append the amount first: it is the only column that can reject a value
+        self._col_amount.append(transaction["amount_paise"])
+        sender = _canon(transaction["sender"])
+        if sender == "initial_balance":
+            sender_id = _INITIAL_BALANCE_ID
+        else:
+            sender_id = self._user_index.get(sender, _NO_USER_ID)
+        self._col_sender.append(sender_id)
+        self._col_recipient.append(self._user_index.get(_canon(transaction["recipient"]), _NO_USER_ID))
+        self._col_hash.append(block.hash)
+        self._col_previous_hash.append(block.previous_hash)
+    
+    def _append_block(self, block: Block):
+        """Append a block to the chain, the column store and the cached balances."""
+        # Columns first, so a rejected block leaves the chain untouched
+        self._append_columns(block)
+        self.chain.append(block)
+        self._apply_to_balances(block.transaction)
+    
+    def _set_chain(self, chain: List[Block]):
+        """Replace the whole chain and rebuild everything derived from it."""
+        self.chain = chain
+        self._reset_columns()
+        for block in chain:
+            self._append_columns(block)
+        self._recompute_balances()
+    
     def is_chain_valid(self) -> bool:
         """Verify the integrity of the blockchain."""
+        if not self.is_chain_linked() or not self.deep_verify():
+            return False
+        
+        self.logger.info("Blockchain validated successfully")
+        return True
+    
+    def is_chain_linked(self) -> bool:
+        """Check the previous hash references only, without rehashing any block."""
+        # Fast path: all previous hash references match in one list compare
+        if self._col_hash[:-1] == self._col_previous_hash[1:]:
+            return True
+        
         for i in range(1, len(self.chain)):
             current_block = self.chain[i]
             previous_block = self.chain[i-1]
             
-            # Check if the hash of the block is correct
-            if current_block.hash != current_block.calculate_hash():
-                self.logger.warning(f"Block {current_block.index} has invalid hash")
-                return False
-            
             # Check if the previous hash reference is correct
             if current_block.previous_hash != previous_block.hash:
                 self.logger.warning(f"Block {current_block.index} has invalid previous hash reference")
                 return False
         
-        self.logger.info("Blockchain validated successfully")
+        return True
+    
+    def deep_verify(self) -> bool:
+        """Rehash every block to detect tampering, using worker processes for long chains."""
+        rows = [(block.index, block._preimage, block.hash) for block in self.chain[1:]]
+        
+        workers = os.cpu_count() or 1
+        if workers > 1 and len(rows) >= self.parallel_verify_threshold:
+            chunk_size = -(-len(rows) // workers)
+            chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_verify_chunk, chunks))
+        else:
+            results = [_verify_chunk(rows)]
+        
+        for bad_index in results:
+            if bad_index != -1:
+                self.logger.warning(f"Block {bad_index} has invalid hash")
+                return False
+        
         return True
     
     def calculate_balances(self) -> Dict[str, float]:
-        """Calculate the current balance of each user."""
-        balances = {
-            "alice": 0,
-            "bob": 0,
-            "charlie": 0,
-            "dave": 0
-        }
+        """Return the current balance of each user in rupees."""
+        return {user: _to_rupees(balance) for user, balance in self._balances.items()}
+    
+    def _apply_to_balances(self, transaction: Dict):
+        """Apply a single transaction to the cached balances."""
+        balances = self._balances
+        sender = _canon(transaction["sender"])
+        recipient = _canon(transaction["recipient"])
+        amount = transaction["amount_paise"]
         
-        for block in self.chain[1:]:  # Skip genesis block
-            transaction = block.transaction
-            sender = transaction["sender"].lower()
-            recipient = transaction["recipient"].lower()
-            amount = transaction["amount"]
-            
-            # Handle initial balance setting
-            if sender == "initial_balance":
-                if recipient in balances:
-                    balances[recipient] = amount
-                continue
-            
-            if sender in balances:
-                balances[sender] -= amount
-            
+        # Handle initial balance setting
+        if sender == "initial_balance":
             if recipient in balances:
-                balances[recipient] += amount
+                balances[recipient] = amount
+            return
+        
+        if sender in balances:
+            balances[sender] -= amount
         
-        return balances
+        if recipient in balances:
+            balances[recipient] += amount
+    
+    def _recompute_balances(self):
+        """Rebuild the cached balances by replaying the column store."""
+        balances = _replay_balances(self._col_sender, self._col_recipient, self._col_amount, len(self.users))
+        self._balances = dict(zip(self.users, balances))
     
     def get_balance(self, user_id: str = None) -> float:
         """Get the balance of a specific user."""
@@ -361,53 +731,202 @@ class Blockchain:
             user_id = self.user_id
         
         balances = self.calculate_balances()
-        return balances.get(user_id.lower(), 0)
+        return balances.get(_canon(user_id), 0)
     
-    def display_balance_table(self):
+    def display_balance_table(self, balances: Dict[str, float] = None):
         """Display a table of current balances for all users."""
-        balances = self.calculate_balances()
+        if balances is None:
+            balances = self.calculate_balances()
         
-        self.logger.info("Current Balance Table:")
-        self.logger.info("=============================================")
-        self.logger.info("| User     | Balance (Rupees)               |")
-        self.logger.info("=============================================")
+        lines = [
+            "Current Balance Table:",
+            "=============================================",
+            "| User     | Balance (Rupees)               |",
+            "============================================="
+        ]
         for user, balance in balances.items():
-            self.logger.info(f"| {user.ljust(8)} | {str(balance).ljust(28)} |")
-        self.logger.info("=============================================")
+            lines.append(f"| {user.ljust(8)} | {str(balance).ljust(28)} |")
+        lines.append("=============================================")
+        table = "\n".join(lines)
+        
+        self.logger.info(table)
         
         # Also print to console for immediate feedback
-        print("\nCurrent Balance Table:")
-        print("=============================================")
-        print("| User     | Balance (Rupees)               |")
-        print("=============================================")
-        for user, balance in balances.items():
-            print(f"| {user.ljust(8)} | {str(balance).ljust(28)} |")
-        print("=============================================\n")
+        if self.verbose:
+            print(f"\n{table}\n")
     
     def to_dict(self) -> Dict:
         """Convert blockchain to dictionary for serialization."""
         return {
+            "version": _CHAIN_FORMAT_VERSION,
             "chain": [block.to_dict() for block in self.chain]
         }
     
     def from_dict(self, blockchain_dict: Dict):
         """Load blockchain from dictionary."""
-        self.chain = [Block.from_dict(block_dict) for block_dict in blockchain_dict["chain"]]
+        version = blockchain_dict.get("version")
+        if version is None:
+            version = _untagged_format_version(blockchain_dict["chain"])
+        _check_format_version(version)
+        if version < _CHAIN_FORMAT_VERSION:
+            self._set_chain(self._migrate_chain(blockchain_dict["chain"], version))
+        else:
+            self._set_chain([Block.from_dict(block_dict) for block_dict in blockchain_dict["chain"]])
         self.logger.info(f"Loaded blockchain with {len(self.chain)} blocks")
     
+    def _migrate_chain(self, block_dicts: List[Dict], version: int) -> List[Block]:
+        """Verify a chain written in an older format and rebuild it with current-format hashes."""
+        legacy_hash = _LEGACY_HASHES.get(version)
+        try:
+            verified = legacy_hash is not None and len(block_dicts) > 0 and all(
+                block_dict["hash"] == legacy_hash(block_dict)
+                and (i == 0 or block_dict["previous_hash"] == block_dicts[i - 1]["hash"])
+                for i, block_dict in enumerate(block_dicts)
+            )
+        except (KeyError, TypeError, ValueError):
+            verified = False
+        
+        if not verified:
+            raise ValueError(f"Chain file {self.blockchain_file} (format {version}) cannot be verified; "
+                             f"delete the data and users directories to start a new chain")
+        
+        # Rehash every block and relink the chain
+        chain = []
+        previous_hash = _GENESIS_PREVIOUS_HASH
+        for block_dict in block_dicts:
+            transaction = block_dict["transaction"]
+            if "amount_paise" in transaction:
+                amount = _check_paise(transaction["amount_paise"])
+            else:
+                amount = _to_paise(transaction["amount"])
+            
+            block = Block(block_dict["index"], block_dict["timestamp"], {
+                "sender": _canon(transaction["sender"]),
+                "recipient": _canon(transaction["recipient"]),
+                "amount_paise": amount
+            }, previous_hash)
+            chain.append(block)
+            previous_hash = block.hash
+        
+        self.logger.info(f"Migrated {len(chain)} blocks from chain format {version} to {_CHAIN_FORMAT_VERSION}")
+        return chain
+    
+    def _legacy_log_blocks(self, block_dicts: List[Dict]) -> List[Dict]:
+        """Read the block log entries that extend an older-format snapshot, without converting them."""
+        blocks = []
+        if os.path.exists(self.block_log_file):
+            last = block_dicts[-1] if block_dicts else None
+            with open(self.block_log_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    block_dict = _json_loads(line)
+                    if last is None or (block_dict["index"] == last["index"] + 1
+                                        and block_dict["previous_hash"] == last["hash"]):
+                        blocks.append(block_dict)
+                        last = block_dict
+        return blocks
+    
     def save_to_file(self, filename: str):
         """Save blockchain to a file."""
-        with open(filename, 'w') as f:
-            json.dump(self.to_dict(), f)
+        with open(filename, 'wb') as f:
+            f.write(_json_dumps(self.to_dict()))
         self.logger.info(f"Saved blockchain to {filename}")
+        
+        # Keep the transaction log consistent with the snapshot
+        self._tx_log_fh.flush()
+        
+        if filename == self.blockchain_file:
+            # The snapshot holds every block, so start a fresh block log
+            if self._block_log is not None:
+                self._block_log.close()
+            self._block_log = open(self.block_log_file, 'wb', buffering=65536)
+            self._blocks_since_save = 0
+            
+            # Keep the user files in step with the chain
+            self._flush_user_files()
+    
+    def _append_block_log(self, block: Block):
+        """Append a new block to the block log, compacting it into a snapshot every autosave_interval blocks."""
+        self._block_log.write(_json_dumps(block.to_dict()) + b"\n")
+        self._blocks_since_save += 1
+        
+        if self._blocks_since_save >= self.autosave_interval:
+            self.save_to_file(self.blockchain_file)
+        else:
+            self._block_log.flush()
+            self._tx_log_fh.flush()
+            self._flush_user_files()
+    
+    def _replay_block_log(self):
+        """Append blocks logged since the last snapshot and reopen the block log."""
+        replayed = 0
+        if os.path.exists(self.block_log_file):
+            with open(self.block_log_file, 'rb') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    block = Block.from_dict(_json_loads(line))
+                    
+                    # Skip blocks the snapshot already holds
+                    latest_block = self.get_latest_block()
+                    if block.index == latest_block.index + 1 and block.previous_hash == latest_block.hash:
+                        self._append_block(block)
+                        replayed += 1
+            self.logger.info(f"Replayed {replayed} blocks from {self.block_log_file}")
+        
+        self._blocks_since_save = replayed
+        self._block_log = open(self.block_log_file, 'ab', buffering=65536)
+    
+    def close(self):
+        """Write a final blockchain snapshot and close the log and user files."""
+        if self._block_log is not None:
+            self.save_to_file(self.blockchain_file)
+            self._block_log.close()
+            self._block_log = None
+        
+        for user_file in [*self._user_ledger.values(), *self._user_balance_file.values()]:
+            user_file.close()
+        self._user_ledger = {}
+        self._user_balance_file = {}
+        
+        self._tx_log_fh.close()
+        self._log_buffer.flush()
     
     def load_from_file(self, filename: str):
         """Load blockchain from a file."""
         if os.path.exists(filename):
-            with open(filename, 'r') as f:
-                blockchain_dict = json.load(f)
-            self.from_dict(blockchain_dict)
+            streamed = False
+            if ijson is not None:
+                with open(filename, 'rb') as f:
+                    if _read_format_version(f) == _CHAIN_FORMAT_VERSION:
+                        # Build blocks one at a time instead of materializing the whole document
+                        self._set_chain([])
+                        f.seek(0)
+                        for block_dict in ijson.items(f, "chain.item", use_float=True):
+                            self._append_block(Block.from_dict(block_dict))
+                        self.logger.info(f"Loaded blockchain with {len(self.chain)} blocks")
+                        streamed = True
+            
+            if not streamed:
+                with open(filename, 'rb') as f:
+                    blockchain_dict = _json_loads(f.read())
+                
+                if blockchain_dict.get("version", 1) < _CHAIN_FORMAT_VERSION and filename == self.blockchain_file:
+                    # Migrate the snapshot together with its block log, then save it in the current format
+                    blockchain_dict["chain"] += self._legacy_log_blocks(blockchain_dict["chain"])
+                    self.from_dict(blockchain_dict)
+                    self._migrated = True
+                    self.save_to_file(filename)
+                    self.logger.info(f"Loaded and migrated blockchain from {filename}")
+                    return
+                
+                self.from_dict(blockchain_dict)
             self.logger.info(f"Loaded blockchain from {filename}")
+            
+            # Replay blocks added since the snapshot
+            if filename == self.blockchain_file:
+                self._replay_block_log()
         else:
             self.logger.warning(f"Blockchain file {filename} not found")
             # Create genesis block if file doesn't exist
@@ -418,15 +937,39 @@ class Blockchain:
         if user is None:
             user = self.user_id
             
-        user_file = f"users/{user.lower()}.json"
+        user = _canon(user)
+        ledger = self._user_ledger.get(user)
         
-        if os.path.exists(user_file):
-            with open(user_file, 'r') as f:
-                user_data = json.load(f)
-            return user_data["transactions"]
-        else:
+        if ledger is None:
             self.logger.warning(f"User file for {user} not found")
             return []
+        
+        ledger.flush()
+        with open(f"users/{user}.bin", 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return []
+            
+            # Unpack records straight out of the mapped file, ignoring a torn trailing record
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return [self._unpack_user_record(*_TX_STRUCT.unpack_from(mm, offset))
+                        for offset in range(0, size - _TX_STRUCT.size + 1, _TX_STRUCT.size)]
+    
+    def _unpack_user_record(self, timestamp: float, type_id: int, counterparty_id: int, amount: int, block_hash: bytes) -> Dict:
+        """Convert a ledger record into a transaction history entry."""
+        tx_type = _TX_TYPES[type_id]
+        record = {
+            "type": tx_type,
+            "amount": _to_rupees(amount),
+            "timestamp": _format_timestamp(timestamp),
+            "block_hash": block_hash.hex()
+        }
+        
+        if tx_type != "initial_balance":
+            counterparty = self.users[counterparty_id] if counterparty_id < len(self.users) else "unknown"
+            record["to" if tx_type == "sent" else "from"] = counterparty
+        
+        return record
     
     def add_block_from_peer(self, block_dict: Dict) -> bool:
         """Add a block received from a peer to the blockchain."""
@@ -444,7 +987,7 @@ class Blockchain:
             
             # Check if previous hash matches
             if block.previous_hash != latest_block.hash:
-                self.logger.warning(f"Previous hash mismatch: expected {latest_block.hash}, got {block.previous_hash}")
+                self.logger.warning(f"Previous hash mismatch: expected {latest_block.hex_hash}, got {block.previous_hash.hex()}")
                 return False
             
             # Verify transaction
@@ -453,20 +996,22 @@ class Blockchain:
                 return False
         
         # Add the block to the chain
-        self.chain.append(block)
-        self.logger.info(f"Added block {block.index} from peer with hash: {block.hash}")
+        self._append_block(block)
+        self.logger.info(f"Added block {block.index} from peer with hash: {block.hex_hash}")
+        balances = self.calculate_balances()
         
         # Update transaction log
-        self.update_transaction_log(block)
+        self.update_transaction_log(block, balances)
         
         # Update user files
         self.update_user_files(block)
         
         # Save blockchain
-        self.save_to_file(f"data/{self.user_id}_blockchain.json")
+        self._append_block_log(block)
         
         # Display balance table
-        self.display_balance_table()
+        if self.autodisplay:
+            self.display_balance_table(balances)
         
         return True
     
@@ -486,50 +1031,63 @@ class Blockchain:
             # Check if the chain is longer and valid
             if length > max_length:
                 # Verify the chain
-                valid = True
-                for i in range(1, length):
-                    if peer_chain[i].previous_hash != peer_chain[i-1].hash:
-                        valid = False
-                        break
-                    if peer_chain[i].hash != peer_chain[i].calculate_hash():
-                        valid = False
-                        break
-                
-                if valid:
+                if self._verify_chain_batch(peer_chain):
                     max_length = length
                     new_chain = peer_chain
         
         # Replace our chain if we found a longer valid one
         if new_chain:
-            self.chain = new_chain
+            self._set_chain(new_chain)
             self.logger.info(f"Replaced chain with longer valid chain of length {max_length}")
             
             # Update user files based on new chain
             self.update_all_user_files()
             
             # Save blockchain
-            self.save_to_file(f"data/{self.user_id}_blockchain.json")
+            self.save_to_file(self.blockchain_file)
             
             return True
         
         return False
     
+    @staticmethod
+    def _verify_chain_batch(blocks: List[Block]) -> bool:
+        """Check linkage and hashes of a list of blocks, stopping at the first mismatch."""
+        # Linkage is a plain string compare, so check the whole chain before hashing
+        previous_hash = blocks[0].hash
+        for block in blocks[1:]:
+            if block.previous_hash != previous_hash:
+                return False
+            previous_hash = block.hash
+        
+        for block in blocks[1:]:
+            if block.hash != block.calculate_hash():
+                return False
+        
+        return True
+    
     def update_all_user_files(self):
         """Update all user files based on the current blockchain."""
-        # Reset user files
-        for user in self.users:
-            user_file = f"users/{user}.json"
-            user_data = {
-                "name": user.capitalize(),
-                "balance": 0,
-                "transactions": []
-            }
-            with open(user_file, 'w') as f:
-                json.dump(user_data, f, indent=2)
-        
-        # Replay all transactions
+        records = {user: [] for user in self.users}
+        balances = self._bal_template.copy()
+        
+        # Replay all transactions in memory
         for block in self.chain[1:]:  # Skip genesis block
-            self.update_user_files(block)
+            for user, tx_type, counterparty, amount in self._user_entries(block):
+                balances[user] = self._next_user_balance(balances[user], tx_type, amount)
+                records[user].append(self._pack_user_record(tx_type, counterparty, amount, block))
+        
+        # Rewrite each user's files with a single write
+        for user in self.users:
+            self._user_ledger[user].close()
+            with open(f"users/{user}.bin", 'wb') as f:
+                f.write(b"".join(records[user]))
+            self._user_ledger[user] = open(f"users/{user}.bin", 'ab', buffering=65536)
+            
+            self._user_balances[user] = balances[user]
+            self._write_user_balance(user)
+        
+        self._flush_user_files()
         
         self.logger.info("Updated all user files based on current blockchain")
 
@@ -4,52 +4,487 @@ import json
 import time
 import sys
 import os
+import struct
+import random
+import selectors
+from collections import OrderedDict
+from queue import Empty, SimpleQueue
 from blockchain import Blockchain
 
+# Wire messages are JSON; use msgspec's faster codec when available (optional dependency)
+try:
+    import msgspec
+except ImportError:
+    def _encode(obj) -> bytes:
+        return json.dumps(obj).encode('utf-8')
+    
+    def _decode(data):
+        return json.loads(bytes(data))
+else:
+    _encode = msgspec.json.Encoder().encode
+    _decode = msgspec.json.Decoder().decode
+
+# Address of every node in the network
+PEER_ADDRS = {
+    'alice': ('127.0.0.1', 5001),
+    'bob': ('127.0.0.1', 5002),
+    'charlie': ('127.0.0.1', 5003),
+    'dave': ('127.0.0.1', 5004)
+}
+
+# Frame header: payload length as a 4-byte big-endian unsigned int
+_HEADER = struct.Struct('>I')
+
+# Largest payload accepted from a peer; a longer header means a broken or hostile sender
+_MAX_FRAME = 64 << 20
+
+# Most transaction hashes remembered for gossip deduplication
+_SEEN_LIMIT = 4096
+
+# Seconds between checks that the I/O loop is still alive while waiting on it
+_CALL_POLL_INTERVAL = 0.5
+
+# Seconds to wait for a peer to accept and answer the handshake
+_CONNECT_TIMEOUT = 2.0
+
+# Longest pause, in seconds, between reconnection attempts
+_MAX_BACKOFF = 30
+
+# Kernel send and receive buffer size for peer sockets
+_SOCKET_BUFFER = 1 << 20
+
+# Initial size of each connection's receive buffer
+_RECV_SIZE = 65536
+
+def _frame(obj) -> bytes:
+    """Encode a message as a 4-byte big-endian length prefix followed by the payload."""
+    payload = _encode(obj)
+    return _HEADER.pack(len(payload)) + payload
+
+def _tune(sock):
+    """Disable Nagle's algorithm, enlarge kernel buffers and enable keepalive on a peer socket."""
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, _SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+def _recv_exactly(sock, n):
+    """Read exactly n bytes from a socket, or return None if the connection closed."""
+    buf = bytearray(n)
+    view = memoryview(buf)
+    pos = 0
+    while pos < n:
+        received = sock.recv_into(view[pos:])
+        if received == 0:
+            return None
+        pos += received
+    return buf
+
+def _recv(sock):
+    """Receive one length-prefixed message, or return None if the connection closed."""
+    header = _recv_exactly(sock, 4)
+    if header is None:
+        return None
+    length = _HEADER.unpack(header)[0]
+    if length > _MAX_FRAME:
+        raise ValueError(f"Frame of {length} bytes exceeds the {_MAX_FRAME} byte limit")
+    payload = _recv_exactly(sock, length)
+    if payload is None:
+        return None
+    return _decode(payload)
+
+def _parse_frames(view, end):
+    """Decode every complete length-prefixed message in view[:end], returning (bytes consumed, messages)."""
+    messages = []
+    start = 0
+    
+    # A single read may hold several frames, or only part of one
+    while end - start >= _HEADER.size:
+        length = _HEADER.unpack_from(view, start)[0]
+        if length > _MAX_FRAME:
+            raise ValueError(f"Frame of {length} bytes exceeds the {_MAX_FRAME} byte limit")
+        frame_end = start + _HEADER.size + length
+        if frame_end > end:
+            break
+        messages.append(_decode(view[start + _HEADER.size:frame_end]))
+        start = frame_end
+    return start, messages
+
+class PeerState:
+    """Buffers for one peer connection owned by the I/O loop."""
+    def __init__(self, sock, peer_id=None):
+        self.sock = sock
+        self.peer_id = peer_id  # None until an inbound peer has identified itself
+        self.out_buf = bytearray()
+        
+        # Receive buffer, filled up to rxpos and reused for the life of the connection
+        self.rxbuf = bytearray(_RECV_SIZE)
+        self.rxmv = memoryview(self.rxbuf)
+        self.rxpos = 0
+        self.closing = False
+        self.writing = False  # whether the selector is watching for writability
+        self.closed = False
+
+class IOLoop:
+    """Single-threaded selector loop (epoll on Linux) that owns every peer socket."""
+    def __init__(self, node):
+        self.node = node
+        self.sel = selectors.DefaultSelector()
+        self.server_socket = None
+        self.running = False
+        
+        # Identified peers by peer id
+        self.peers = {}
+        
+        # Calls handed over from other threads, and a socket pair to wake the selector for them
+        self._calls = SimpleQueue()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._wake_pending = False
+        self.sel.register(self._wake_r, selectors.EVENT_READ)
+        
+        # Connections with output queued since the last flush
+        self._pending = {}
+    
+    def listen(self, server_socket):
+        """Accept inbound connections on a bound, listening socket."""
+        server_socket.setblocking(False)
+        self.server_socket = server_socket
+        self.sel.register(server_socket, selectors.EVENT_READ)
+    
+    def call_soon(self, fn, *args):
+        """Run fn(*args) on the loop thread."""
+        self._calls.put((fn, args))
+        
+        # One wakeup covers every call queued before the loop next drains the queue
+        if self._wake_pending:
+            return
+        self._wake_pending = True
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            # The loop has shut down
+            pass
+    
+    def add_peer(self, peer_id, sock):
+        """Hand an identified outbound connection over to the loop."""
+        self.call_soon(self._add_peer, peer_id, sock)
+    
+    def send(self, peer_id, frame):
+        """Queue an encoded frame for one peer."""
+        self.call_soon(self._send_to, peer_id, frame)
+    
+    def broadcast(self, frame, exclude=None):
+        """Queue an encoded frame for every connected peer except exclude."""
+        self.call_soon(self._broadcast, frame, exclude)
+    
+    def stop(self):
+        """Close every connection and stop the loop."""
+        self.call_soon(self._stop)
+    
+    def run(self):
+        """Serve socket events until stopped."""
+        self.running = True
+        try:
+            while self.running:
+                for key, events in self.sel.select():
+                    if key.fileobj is self._wake_r:
+                        self._run_calls()
+                    elif key.fileobj is self.server_socket:
+                        self._on_accept()
+                    else:
+                        self._on_events(key.data, events)
+                
+                if self._pending:
+                    self._flush_pending()
+        except Exception as e:
+            print(f"I/O loop error: {e}")
+        finally:
+            self.running = False
+            
+            # Drop every connection so the node does not keep listing dead peers
+            self._stop()
+            self.sel.close()
+            self._wake_r.close()
+            self._wake_w.close()
+    
+    def _on_events(self, state, events):
+        """Serve one connection's events, closing only that connection if handling fails."""
+        try:
+            if events & selectors.EVENT_READ and not state.closed:
+                self._on_readable(state)
+            if events & selectors.EVENT_WRITE and not state.closed:
+                self._on_writable(state)
+        except Exception as e:
+            print(f"Error on connection to {state.peer_id}: {e}")
+            self._close(state)
+    
+    def _run_calls(self):
+        """Run every call queued by other threads."""
+        # Empty the wake socket before clearing the flag, so a wakeup sent from here on is never read away
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._wake_pending = False
+        
+        while True:
+            try:
+                fn, args = self._calls.get_nowait()
+            except Empty:
+                break
+            
+            try:
+                fn(*args)
+            except Exception as e:
+                print(f"Error in I/O loop call: {e}")
+    
+    def _on_accept(self):
+        """Accept an inbound connection and wait for it to identify itself."""
+        try:
+            client_socket, address = self.server_socket.accept()
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"Error accepting connection: {e}")
+            return
+        print(f"Connection from {address}")
+        
+        try:
+            _tune(client_socket)
+            client_socket.setblocking(False)
+            self.sel.register(client_socket, selectors.EVENT_READ, PeerState(client_socket))
+        except Exception as e:
+            print(f"Error accepting connection from {address}: {e}")
+            client_socket.close()
+    
+    def _add_peer(self, peer_id, sock):
+        """Start serving an outbound connection that completed its handshake."""
+        state = PeerState(sock)
+        try:
+            sock.setblocking(False)
+            self.sel.register(sock, selectors.EVENT_READ, state)
+            self._register(state, peer_id)
+        except Exception as e:
+            print(f"Error adding connection to {peer_id}: {e}")
+            self._close(state)
+    
+    def _register(self, state, peer_id):
+        """Make an identified connection reachable by peer id."""
+        state.peer_id = peer_id
+        self.peers[peer_id] = state
+        self.node.on_peer_connected(peer_id, state.sock)
+    
+    def _on_readable(self, state):
+        """Read what is available and dispatch every complete message."""
+        # A frame larger than the buffer fills it without completing; make room.
+        # Its header has already passed the _MAX_FRAME check, so growth is bounded
+        if state.rxpos == len(state.rxbuf):
+            self._resize_rx(state, 2 * len(state.rxbuf))
+        
+        try:
+            received = state.sock.recv_into(state.rxmv[state.rxpos:])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            print(f"Error reading from {state.peer_id}: {e}")
+            received = 0
+        
+        if received == 0:
+            self._close(state)
+            return
+        
+        end = state.rxpos + received
+        try:
+            consumed, messages = _parse_frames(state.rxmv, end)
+        except Exception as e:
+            print(f"Malformed message from {state.peer_id}: {e}")
+            self._close(state)
+            return
+        
+        # Move any partial frame to the front of the buffer
+        remaining = end - consumed
+        if consumed and remaining:
+            state.rxmv[:remaining] = state.rxmv[consumed:end]
+        state.rxpos = remaining
+        
+        # Give back memory grown for a large frame once it has been handled
+        if not remaining and len(state.rxbuf) > _RECV_SIZE:
+            self._resize_rx(state, _RECV_SIZE)
+        
+        for message in messages:
+            if state.closing or state.closed:
+                break
+            self._dispatch(state, message)
+    
+    def _resize_rx(self, state, size):
+        """Replace a connection's receive buffer with one of the given size, keeping buffered bytes."""
+        rxbuf = bytearray(size)
+        rxbuf[:state.rxpos] = state.rxmv[:state.rxpos]
+        state.rxmv.release()
+        state.rxbuf = rxbuf
+        state.rxmv = memoryview(rxbuf)
+    
+    def _dispatch(self, state, message):
+        """Handle the handshake for new inbound peers, then pass messages to the node."""
+        if state.peer_id is None:
+            self._handshake(state, message)
+            return
+        
+        try:
+            self.node.process_peer_message(message, state.peer_id)
+        except Exception as e:
+            print(f"Error handling message from {state.peer_id}: {e}")
+    
+    def _handshake(self, state, peer_data):
+        """Answer an inbound peer's identification message."""
+        peer_id = peer_data.get('peer_id') if isinstance(peer_data, dict) else None
+        peer_id = peer_id.lower() if isinstance(peer_id, str) else ''
+        
+        if not peer_id or peer_id not in self.node.peers:
+            response = {
+                'status': 'error',
+                'message': 'Invalid peer ID'
+            }
+            self._queue(state, _frame(response))
+            
+            # Hang up once the error has been sent
+            state.closing = True
+            return
+        
+        # Send acknowledgment
+        response = {
+            'status': 'connected',
+            'message': f"Connected to {self.node.user_id}"
+        }
+        self._queue(state, _frame(response))
+        self._register(state, peer_id)
+    
+    def _queue(self, state, frame):
+        """Append a frame to a connection's output buffer; it is sent at the end of this loop pass."""
+        if state.closed:
+            return
+        state.out_buf += frame
+        self._pending[state] = None
+    
+    def _flush_pending(self):
+        """Try to send queued output straight away, watching for writability only if the socket is full."""
+        pending = self._pending
+        self._pending = {}
+        for state in pending:
+            if not state.closed and not state.writing:
+                self._on_events(state, selectors.EVENT_WRITE)
+    
+    def _watch_writes(self, state, enabled):
+        """Turn the selector's write interest for a connection on or off."""
+        if state.writing != enabled:
+            state.writing = enabled
+            events = selectors.EVENT_READ | selectors.EVENT_WRITE if enabled else selectors.EVENT_READ
+            self.sel.modify(state.sock, events, state)
+    
+    def _send_to(self, peer_id, frame):
+        """Queue a frame for a peer if it is still connected."""
+        state = self.peers.get(peer_id)
+        if state is not None:
+            self._queue(state, frame)
+    
+    def _broadcast(self, frame, exclude):
+        """Queue a frame for every identified peer except exclude."""
+        for peer_id, state in self.peers.items():
+            if peer_id != exclude:
+                self._queue(state, frame)
+    
+    def _on_writable(self, state):
+        """Send as much buffered output as the socket takes."""
+        try:
+            sent = state.sock.send(state.out_buf)
+        except BlockingIOError:
+            self._watch_writes(state, True)
+            return
+        except OSError as e:
+            print(f"Error sending to {state.peer_id}: {e}")
+            self._close(state)
+            return
+        
+        del state.out_buf[:sent]
+        if state.out_buf:
+            # The socket is full; finish once it drains
+            self._watch_writes(state, True)
+        elif state.closing:
+            self._close(state)
+        else:
+            self._watch_writes(state, False)
+    
+    def _close(self, state):
+        """Close a connection and forget it."""
+        if state.closed:
+            return
+        state.closed = True
+        try:
+            self.sel.unregister(state.sock)
+        except (KeyError, ValueError):
+            # Never registered, e.g. a handoff that failed part way
+            pass
+        state.sock.close()
+        
+        if state.peer_id is not None and self.peers.get(state.peer_id) is state:
+            del self.peers[state.peer_id]
+            self.node.on_peer_disconnected(state.peer_id, state.sock)
+            print(f"Connection to {state.peer_id} closed")
+    
+    def _stop(self):
+        """Close every connection and leave the select loop."""
+        for key in list(self.sel.get_map().values()):
+            if isinstance(key.data, PeerState):
+                self._close(key.data)
+        self.running = False
+
 class BlockchainPeer:
     def __init__(self, user_id, host='127.0.0.1', port=None):
         self.user_id = user_id.lower()
         self.host = host
         
         # Assign port based on user_id
-        if port is None:
-            if self.user_id == 'alice':
-                self.port = 5001
-            elif self.user_id == 'bob':
-                self.port = 5002
-            elif self.user_id == 'charlie':
-                self.port = 5003
-            elif self.user_id == 'dave':
-                self.port = 5004
-            else:
-                raise ValueError(f"Unknown user_id: {user_id}")
-        else:
-            self.port = port
+        if self.user_id not in PEER_ADDRS:
+            raise ValueError(f"Unknown user_id: {user_id}")
+        self.port = port or PEER_ADDRS[self.user_id][1]
         
         # Initialize blockchain
         self.blockchain = Blockchain(self.user_id)
         
-        # Peer information
-        self.peers = {
-            'alice': ('127.0.0.1', 5001),
-            'bob': ('127.0.0.1', 5002),
-            'charlie': ('127.0.0.1', 5003),
-            'dave': ('127.0.0.1', 5004)
-        }
-        
-        # Remove self from peers
-        if self.user_id in self.peers:
-            del self.peers[self.user_id]
+        # Peer information, excluding self
+        self.peers = {peer_id: addr for peer_id, addr in PEER_ADDRS.items() if peer_id != self.user_id}
         
         # Initialize server socket
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        _tune(self.server_socket)
         
-        # Lock for thread safety
-        self.lock = threading.Lock()
+        # Serializes blockchain access between the menu and the I/O thread
+        self._chain_lock = threading.Lock()
         
-        # Connected peers
+        # Connected peers; only the I/O thread writes it, always by swapping in a new dict
         self.connected_peers = {}
+        
+        # Requests that never change, encoded once
+        self._get_chain_frame = _frame({'type': 'get_chain'})
+        self._hello_frame = _frame({'peer_id': self.user_id})
+        
+        # Encoded 'chain' reply and the chain tip it was built from
+        self._cached_chain_frame = None
+        self._chain_frame_tip = None
+        
+        # Recently seen transaction hashes, oldest first; only touched on the I/O thread
+        self._seen = OrderedDict()
+        
+        # Set on exit to stop the reconnect thread
+        self._stopped = threading.Event()
+        self._io_thread = None
+        
+        # Single I/O thread serving every peer socket
+        self.loop = IOLoop(self)
     
     def start(self):
         """Start the blockchain peer."""
@@ -59,16 +494,17 @@ class BlockchainPeer:
             self.server_socket.listen(5)
             print(f"{self.user_id.capitalize()} node started on {self.host}:{self.port}")
             
-            # Start server thread
-            server_thread = threading.Thread(target=self.listen_for_connections)
-            server_thread.daemon = True
-            server_thread.start()
+            # Start the I/O thread, which also accepts inbound peers
+            self.loop.listen(self.server_socket)
+            self._io_thread = threading.Thread(target=self.loop.run)
+            self._io_thread.daemon = True
+            self._io_thread.start()
             
-            # Connect to peers
+            # Connect to peers, then keep retrying any that are down in the background
             self.connect_to_peers()
-            
-            # Synchronize blockchain with peers
-            self.synchronize_blockchain()
+            reconnect_thread = threading.Thread(target=self._reconnect_loop)
+            reconnect_thread.daemon = True
+            reconnect_thread.start()
             
             # Ask for initial balance if not set
             self.check_initial_balance()
@@ -81,123 +517,79 @@ class BlockchainPeer:
         finally:
             self.server_socket.close()
     
-    def listen_for_connections(self):
-        """Listen for incoming connections from other peers."""
-        try:
-            while True:
-                client_socket, address = self.server_socket.accept()
-                print(f"Connection from {address}")
-                
-                # Start a new thread to handle the client
-                client_thread = threading.Thread(target=self.handle_peer_connection, args=(client_socket,))
-                client_thread.daemon = True
-                client_thread.start()
-        except Exception as e:
-            print(f"Server error: {e}")
+    def connect_to_peers(self):
+        """Connect to other peers."""
+        for peer_id, (host, port) in self.peers.items():
+            if peer_id not in self.connected_peers:
+                self._try_connect(peer_id, host, port, report=True)
     
-    def handle_peer_connection(self, client_socket):
-        """Handle incoming peer connections."""
+    def _try_connect(self, peer_id, host, port, report=False):
+        """Open and identify a connection to one peer, returning whether it succeeded."""
+        peer_socket = None
         try:
-            # Get peer identification
-            data = client_socket.recv(1024).decode('utf-8')
-            peer_data = json.loads(data)
-            peer_id = peer_data.get('peer_id', '').lower()
+            # Create socket; a dead peer must not stall the caller
+            peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            _tune(peer_socket)
+            peer_socket.settimeout(_CONNECT_TIMEOUT)
+            peer_socket.connect((host, port))
             
-            if not peer_id or peer_id not in self.peers:
-                response = {
-                    'status': 'error',
-                    'message': 'Invalid peer ID'
-                }
-                client_socket.send(json.dumps(response).encode('utf-8'))
-                client_socket.close()
-                return
+            # Acknowledge replies immediately rather than delaying ACKs (Linux only)
+            if hasattr(socket, 'TCP_QUICKACK'):
+                peer_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
             
-            # Register the peer
-            with self.lock:
-                self.connected_peers[peer_id] = client_socket
+            # Send identification
+            peer_socket.sendall(self._hello_frame)
             
-            # Send acknowledgment
-            response = {
-                'status': 'connected',
-                'message': f"Connected to {self.user_id}"
-            }
-            client_socket.send(json.dumps(response).encode('utf-8'))
+            # Get response
+            response = _recv(peer_socket) or {}
             
-            # Handle peer messages
-            while True:
-                data = client_socket.recv(4096).decode('utf-8')
-                if not data:
-                    break
-                
-                message = json.loads(data)
-                self.process_peer_message(message, peer_id, client_socket)
+            if response.get('status') == 'connected':
+                # The I/O loop serves the connection from here on
+                self.loop.add_peer(peer_id, peer_socket)
+                print(f"Connected to {peer_id}")
+                return True
+            
+            if report:
+                print(f"Failed to connect to {peer_id}: {response.get('message', 'Unknown error')}")
         
         except Exception as e:
-            print(f"Error handling peer connection: {e}")
-        finally:
-            # Clean up when peer disconnects
-            with self.lock:
-                if peer_id in self.connected_peers:
-                    del self.connected_peers[peer_id]
-            client_socket.close()
-            print(f"Connection from {peer_id} closed")
+            if report:
+                print(f"Error connecting to {peer_id}: {e}")
+        
+        if peer_socket is not None:
+            peer_socket.close()
+        return False
     
-    def connect_to_peers(self):
-        """Connect to other peers."""
-        for peer_id, (host, port) in self.peers.items():
-            if peer_id not in self.connected_peers:
-                try:
-                    # Create socket
-                    peer_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    peer_socket.connect((host, port))
-                    
-                    # Send identification
-                    peer_data = {
-                        'peer_id': self.user_id
-                    }
-                    peer_socket.send(json.dumps(peer_data).encode('utf-8'))
-                    
-                    # Get response
-                    response = json.loads(peer_socket.recv(1024).decode('utf-8'))
-                    
-                    if response.get('status') == 'connected':
-                        with self.lock:
-                            self.connected_peers[peer_id] = peer_socket
-                        print(f"Connected to {peer_id}")
-                        
-                        # Start a thread to listen for messages from this peer
-                        listener_thread = threading.Thread(target=self.listen_to_peer, args=(peer_socket, peer_id))
-                        listener_thread.daemon = True
-                        listener_thread.start()
-                    else:
-                        print(f"Failed to connect to {peer_id}: {response.get('message', 'Unknown error')}")
-                        peer_socket.close()
-                
-                except Exception as e:
-                    print(f"Error connecting to {peer_id}: {e}")
+    def _reconnect_loop(self):
+        """Keep retrying peers that are not connected, backing off while none come up."""
+        attempts = 0
+        while not self._stopped.wait(min(_MAX_BACKOFF, 0.5 * 2 ** attempts) + random.uniform(0, 0.5)):
+            connected_any = False
+            for peer_id, (host, port) in self.peers.items():
+                if peer_id not in self.connected_peers and self._try_connect(peer_id, host, port):
+                    connected_any = True
+            
+            missing = any(peer_id not in self.connected_peers for peer_id in self.peers)
+            attempts = attempts + 1 if missing and not connected_any else 0
     
-    def listen_to_peer(self, peer_socket, peer_id):
-        """Listen for messages from a connected peer."""
-        try:
-            while True:
-                data = peer_socket.recv(4096).decode('utf-8')
-                if not data:
-                    break
-                
-                message = json.loads(data)
-                self.process_peer_message(message, peer_id, peer_socket)
+    def on_peer_connected(self, peer_id, peer_socket):
+        """Record a peer connection handed to the I/O loop."""
+        # Replace the dict rather than mutating it so readers never need a lock
+        peers = dict(self.connected_peers)
+        peers[peer_id] = peer_socket
+        self.connected_peers = peers
         
-        except Exception as e:
-            print(f"Error listening to {peer_id}: {e}")
-        finally:
-            # Clean up when connection is lost
-            with self.lock:
-                if peer_id in self.connected_peers:
-                    del self.connected_peers[peer_id]
-            peer_socket.close()
-            print(f"Connection to {peer_id} closed")
+        # Both sides announce their chain height, so whichever side is behind can catch up
+        self.loop.send(peer_id, self._height_frame())
+    
+    def on_peer_disconnected(self, peer_id, peer_socket):
+        """Forget a peer connection the I/O loop has closed."""
+        if self.connected_peers.get(peer_id) is peer_socket:
+            peers = dict(self.connected_peers)
+            del peers[peer_id]
+            self.connected_peers = peers
     
-    def process_peer_message(self, message, peer_id, peer_socket):
+    def process_peer_message(self, message, peer_id):
         """Process messages received from peers."""
         message_type = message.get('type')
         
@@ -205,9 +597,17 @@ class BlockchainPeer:
             # Process a new transaction from a peer
             block_dict = message.get('block')
             
-            if block_dict:
-                with self.lock:
+            # Drop transactions already received from another peer
+            if block_dict and block_dict['hash'] not in self._seen:
+                with self._chain_lock:
                     success = self.blockchain.add_block_from_peer(block_dict)
+                    chain = self.blockchain.chain
+                    index = block_dict['index']
+                    in_chain = isinstance(index, int) and 0 <= index < len(chain) and chain[index].hex_hash == block_dict['hash']
+                
+                # Only remember blocks we hold; one rejected because we are behind may be accepted later
+                if in_chain:
+                    self._mark_seen(block_dict['hash'])
                 
                 if success:
                     print(f"\nReceived new transaction from {peer_id}")
@@ -216,13 +616,16 @@ class BlockchainPeer:
                     # Broadcast to other peers
                     self.broadcast_transaction(block_dict, exclude=peer_id)
         
+        elif message_type == 'height':
+            # A peer announced its chain height; pull its chain only if it is longer,
+            # since resolve_conflicts never adopts a chain of equal length
+            height = message.get('height', 0)
+            if isinstance(height, int) and height > len(self.blockchain.chain):
+                self.loop.send(peer_id, self._get_chain_frame)
+        
         elif message_type == 'get_chain':
             # Send our blockchain to the requesting peer
-            response = {
-                'type': 'chain',
-                'chain': [block.to_dict() for block in self.blockchain.chain]
-            }
-            peer_socket.send(json.dumps(response).encode('utf-8'))
+            self.loop.send(peer_id, self._chain_frame())
         
         elif message_type == 'chain':
             # Received a blockchain from a peer
@@ -230,25 +633,47 @@ class BlockchainPeer:
             
             # Check if the peer's chain is longer than ours
             if len(peer_chain) > len(self.blockchain.chain):
-                with self.lock:
+                with self._chain_lock:
                     # Try to resolve conflicts
                     self.blockchain.resolve_conflicts([peer_chain])
     
+    def _mark_seen(self, block_hash):
+        """Record a transaction hash, forgetting the oldest once there are more than _SEEN_LIMIT."""
+        if block_hash in self._seen:
+            self._seen.move_to_end(block_hash)
+            return
+        
+        self._seen[block_hash] = None
+        if len(self._seen) > _SEEN_LIMIT:
+            self._seen.popitem(last=False)
+    
+    def _height_frame(self):
+        """Encode a 'height' message announcing our chain length."""
+        with self._chain_lock:
+            message = {
+                'type': 'height',
+                'height': len(self.blockchain.chain)
+            }
+        return _frame(message)
+    
+    def _chain_frame(self):
+        """Return the encoded 'chain' message, re-encoding only when the chain has changed."""
+        with self._chain_lock:
+            chain = self.blockchain.chain
+            tip = (len(chain), chain[-1].hash)
+            if self._chain_frame_tip != tip:
+                response = {
+                    'type': 'chain',
+                    'chain': [block.to_dict() for block in chain]
+                }
+                self._cached_chain_frame = _frame(response)
+                self._chain_frame_tip = tip
+            return self._cached_chain_frame
+    
     def synchronize_blockchain(self):
         """Synchronize blockchain with peers."""
         # Request blockchain from all connected peers
-        for peer_id, peer_socket in list(self.connected_peers.items()):
-            try:
-                request = {
-                    'type': 'get_chain'
-                }
-                peer_socket.send(json.dumps(request).encode('utf-8'))
-            except Exception as e:
-                print(f"Error requesting chain from {peer_id}: {e}")
-                # Remove disconnected peer
-                with self.lock:
-                    if peer_id in self.connected_peers:
-                        del self.connected_peers[peer_id]
+        self.loop.broadcast(self._get_chain_frame)
     
     def broadcast_transaction(self, block_dict, exclude=None):
         """Broadcast a transaction to all connected peers."""
@@ -256,43 +681,91 @@ class BlockchainPeer:
             'type': 'transaction',
             'block': block_dict
         }
+        frame = _frame(message)
         
-        for peer_id, peer_socket in list(self.connected_peers.items()):
-            if exclude and peer_id == exclude:
-                continue
-                
-            try:
-                peer_socket.send(json.dumps(message).encode('utf-8'))
-            except Exception as e:
-                print(f"Error broadcasting to {peer_id}: {e}")
-                # Remove disconnected peer
-                with self.lock:
-                    if peer_id in self.connected_peers:
-                        del self.connected_peers[peer_id]
+        # The seen set belongs to the I/O thread, so our own blocks are recorded there too
+        if exclude is None:
+            self.loop.call_soon(self._mark_seen, block_dict['hash'])
+        
+        # The I/O thread does the sending, so no lock is needed here
+        self.loop.broadcast(frame, exclude)
     
     def check_initial_balance(self):
         """Check if initial balance is set and ask for it if not."""
-        balance = self.blockchain.get_balance()
+        with self._chain_lock:
+            balance = self.blockchain.get_balance()
         
         if balance == 0:
+            print(f"\nWelcome {self.user_id.capitalize()}!")
+            
+            # Keep asking until a balance is accepted
+            while True:
+                try:
+                    initial_balance = float(input("Enter your initial balance in rupees: "))
+                    if initial_balance < 0:
+                        print("Balance cannot be negative.")
+                        continue
+                    
+                    # Set and broadcast the initial balance from the I/O thread
+                    self._call_in_loop(self._apply_initial_balance, initial_balance)
+                    break
+                except ValueError:
+                    print("Invalid balance. Please enter a valid number.")
+            
+            print(f"Initial balance set to {initial_balance} rupees")
+    
+    def _apply_initial_balance(self, initial_balance):
+        """Set the initial balance and broadcast its block."""
+        with self._chain_lock:
+            # Set initial balance
+            self.blockchain.set_initial_balance(initial_balance)
+            
+            # Create a block for the initial balance
+            block = self.blockchain.chain[-1]  # Get the last block (initial balance block)
+        
+        # Broadcast to peers
+        self.broadcast_transaction(block.to_dict())
+    
+    def _apply_transaction(self, recipient, amount):
+        """Add a transaction to the blockchain and broadcast its block."""
+        with self._chain_lock:
+            # Add transaction to blockchain
+            block = self.blockchain.add_transaction(self.user_id, recipient, amount)
+        
+        # Broadcast transaction to peers
+        self.broadcast_transaction(block.to_dict())
+        return block
+    
+    def _call_in_loop(self, fn, *args):
+        """Run fn(*args) on the I/O thread and wait for its result, re-raising its errors here."""
+        if not self.loop.running:
+            return fn(*args)
+        
+        done = threading.Event()
+        outcome = {}
+        
+        # Whichever thread takes this first runs the call, so it never runs twice
+        claim = threading.Lock()
+        
+        def run():
+            if not claim.acquire(blocking=False):
+                return
             try:
-                print(f"\nWelcome {self.user_id.capitalize()}!")
-                initial_balance = float(input("Enter your initial balance in rupees: "))
-                
-                with self.lock:
-                    # Set initial balance
-                    self.blockchain.set_initial_balance(initial_balance)
-                
-                # Create a block for the initial balance
-                block = self.blockchain.chain[-1]  # Get the last block (initial balance block)
-                
-                # Broadcast to peers
-                self.broadcast_transaction(block.to_dict())
-                
-                print(f"Initial balance set to {initial_balance} rupees")
-            except ValueError:
-                print("Invalid balance. Please enter a valid number.")
-                self.check_initial_balance()  # Try again
+                outcome['result'] = fn(*args)
+            except Exception as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+        
+        self.loop.call_soon(run)
+        while not done.wait(_CALL_POLL_INTERVAL):
+            # The loop stopped before reaching the call; run it here instead
+            if not self.loop.running and claim.acquire(blocking=False):
+                return fn(*args)
+        
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
     
     def send_transaction(self):
         """Send a transaction to another user."""
@@ -306,29 +779,32 @@ class BlockchainPeer:
             print("You cannot send money to yourself.")
             return
         
+        while True:
+            try:
+                amount = float(input("Enter amount to send: "))
+                break
+            except ValueError:
+                print("Invalid amount. Please enter a valid number.")
+        
+        if amount <= 0:
+            print("Amount must be greater than zero.")
+            return
+        
         try:
-            amount = float(input("Enter amount to send: "))
-            
-            if amount <= 0:
-                print("Amount must be greater than zero.")
-                return
-            
-            with self.lock:
-                # Add transaction to blockchain
-                block = self.blockchain.add_transaction(self.user_id, recipient, amount)
-            
-            # Broadcast transaction to peers
-            self.broadcast_transaction(block.to_dict())
+            # Add and broadcast the transaction from the I/O thread
+            block = self._call_in_loop(self._apply_transaction, recipient, amount)
             
             print(f"Transaction successful! Sent {amount} rupees to {recipient}")
-            print(f"Transaction Hash: {block.hash}")
+            print(f"Transaction Hash: {block.hex_hash}")
         
         except ValueError as e:
             print(f"Transaction failed: {e}")
     
     def view_transaction_history(self):
         """View transaction history."""
-        history = self.blockchain.get_user_transaction_history()
+        # The I/O thread may be rewriting the user files after a chain replacement
+        with self._chain_lock:
+            history = self.blockchain.get_user_transaction_history()
         
         if not history:
             print("No transactions found.")
@@ -351,12 +827,14 @@ class BlockchainPeer:
     
     def check_balance(self):
         """Check current balance."""
-        balance = self.blockchain.get_balance()
+        with self._chain_lock:
+            balance = self.blockchain.get_balance()
         print(f"Your current balance is {balance} rupees")
     
     def verify_blockchain(self):
         """Verify the integrity of the blockchain."""
-        is_valid = self.blockchain.is_chain_valid()
+        with self._chain_lock:
+            is_valid = self.blockchain.is_chain_valid()
         print(f"Blockchain validity: {is_valid}")
     
     def main_menu(self):
@@ -365,8 +843,11 @@ class BlockchainPeer:
             print("\n" + "=" * 50)
             print(f"{self.user_id.capitalize()}'s Blockchain Node")
             print("=" * 50)
-            print(f"Current Balance: {self.blockchain.get_balance()} rupees")
-            print(f"Connected Peers: {', '.join(self.connected_peers.keys()) if self.connected_peers else 'None'}")
+            with self._chain_lock:
+                balance = self.blockchain.get_balance()
+            print(f"Current Balance: {balance} rupees")
+            connected_peers = self.connected_peers
+            print(f"Connected Peers: {', '.join(connected_peers.keys()) if connected_peers else 'None'}")
             print("1. Send Transaction")
             print("2. View Transaction History")
             print("3. Check Balance")
@@ -391,11 +872,16 @@ class BlockchainPeer:
             elif choice == '6':
                 print("Exiting...")
                 # Close all connections
-                for peer_socket in self.connected_peers.values():
-                    try:
-                        peer_socket.close()
-                    except:
-                        pass
+                self._stopped.set()
+                self.loop.stop()
+                
+                # Wait for the I/O thread so no peer block lands while the files are closed
+                if self._io_thread is not None:
+                    self._io_thread.join()
+                
+                # Write user files to disk
+                with self._chain_lock:
+                    self.blockchain.close()
                 break
             else:
                 print("Invalid choice. Please try again.")
@@ -406,7 +892,7 @@ if __name__ == "__main__":
         sys.exit(1)
     
     user_id = sys.argv[1]
-    if user_id.lower() not in ['alice', 'bob', 'charlie', 'dave']:
+    if user_id.lower() not in PEER_ADDRS:
         print("Invalid user ID. Must be one of: Alice, Bob, Charlie, Dave")
         sys.exit(1)
     
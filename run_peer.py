@@ -0,0 +1,17 @@
+import sys
+import os
+
+# Create necessary directories
+for directory in ("logs", "data", "users"):
+    os.makedirs(directory, exist_ok=True)
+
+from peer import PEER_ADDRS, BlockchainPeer
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1].lower() not in PEER_ADDRS:
+        print("Usage: python run_peer.py <Alice|Bob|Charlie|Dave>")
+        sys.exit(1)
+    
+    # Run the named user's node
+    peer = BlockchainPeer(sys.argv[1])
+    peer.start()